@@ -1,14 +1,22 @@
 """clawbot 主入口"""
+import asyncio
+import functools
 import logging
+import re
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from loguru import logger
 from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.filters import CommandStart, Command
+from bot.send_queue import SendQueue
 from config.settings import settings
 from security import is_user_allowed
 from executor import (
-    run_command,
+    claude_pool,
+    run_command_async,
     pull_file,
     push_file,
     list_sessions,
@@ -24,16 +32,21 @@ def _load_session_bindings() -> dict:
     if not os.path.exists(SESSION_BINDINGS_FILE):
         return {}
     try:
-        import json
-        with open(SESSION_BINDINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(SESSION_BINDINGS_FILE, "rb") as f:
+            return orjson.loads(f.read())
     except Exception:
         return {}
 
 def _save_session_bindings(data: dict) -> None:
-    import json
-    with open(SESSION_BINDINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # 先写临时文件再替换，避免写入过程中崩溃导致文件损坏
+    tmp_path = SESSION_BINDINGS_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, SESSION_BINDINGS_FILE)
+
+# 会话绑定启动时加载一次，之后读内存，修改时写回文件
+_SESSION_BINDINGS = _load_session_bindings()
+_SESSION_BINDINGS_LOCK = asyncio.Lock()
 
 # 配置日志
 logger.remove()
@@ -43,11 +56,15 @@ logger.add(
     rotation="1 day",
     retention="30 days",
     level=settings.LOG_LEVEL,
+    enqueue=True,  # 由后台线程写文件，避免在事件循环中阻塞
 )
 
 # 配置代理
 import os
 
+# 每个 update 都要解析 Telegram 返回的 JSON，使用 orjson 可显著降低解析开销
+session_kwargs = {"json_loads": orjson.loads}
+
 # 根据配置决定是否使用代理
 if settings.proxy_url:
     # 使用代理
@@ -57,29 +74,68 @@ if settings.proxy_url:
     os.environ['all_proxy'] = settings.proxy_url
 
     # 使用 aiogram 内置的代理支持
-    from aiogram.client.session.aiohttp import AiohttpSession
-    session = AiohttpSession(proxy=settings.proxy_url)
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, session=session)
+    session = AiohttpSession(proxy=settings.proxy_url, **session_kwargs)
 else:
     # 不使用代理
     print("未配置代理，直接连接")
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+    session = AiohttpSession(**session_kwargs)
+
+# 所有 Bot API 请求与文件下载共用该 session 的连接池；
+# aiohttp 默认 keep-alive 仅 15 秒，延长后连续的 /push 下载可复用已建立的 TLS 连接
+session._connector_init.update(limit_per_host=20, keepalive_timeout=75)
+bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, session=session)
 
 # 初始化 Dispatcher
 dp = Dispatcher()
+
+# 命令参数解析（第一个 token 为命令本身，如 /run 或 /run@bot）
+# /run [--session <id> | --continue | --no-cache] <command>
+_RUN_ARGS_RE = re.compile(
+    r"\S+\s+(?:"
+    r"--session\s+(?P<session_id>\S+)(?:\s+(?P<session_command>.*\S))?"
+    r"|--continue\s+(?P<continue_command>.*\S)"
+    r"|(?P<no_cache>--no-cache)(?:\s+(?P<no_cache_command>.*\S))?"
+    r"|(?P<command>.*\S)"
+    r")\s*",
+    re.DOTALL,
+)
+# /sessions [n] [minutes]
+_SESSIONS_ARGS_RE = re.compile(
+    r"\S+(?:\s+(?P<limit>\S+))?(?:\s+(?P<active_minutes>.*\S))?\s*",
+    re.DOTALL,
+)
+# /session set <id>
+_SESSION_SET_RE = re.compile(r"\S+\s+set\s+(?P<session_id>.*\S)\s*", re.DOTALL)
+
+# TUI 调用可能持续数分钟，使用独立线程执行，
+# 避免占满 asyncio 默认线程池，影响 /sessions、/pull 等短任务
+# （/run 使用 asyncio 子进程，不占用线程）。
+# 所有 TUI 命令共用同一个 tmux 面板只能串行执行，因此只需一个线程
+_CLI_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="claude-tui")
+
+async def _run_cli(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_CLI_EXECUTOR, functools.partial(func, *args, **kwargs))
+
 TELEGRAM_MAX_LEN = 3500
 
+# 所有回复统一经发送队列发出，队列负责并发上限与 Telegram 限流重试
+send_queue = SendQueue(bot, workers=3)
+
+def _chunks(text: str, size: int = TELEGRAM_MAX_LEN):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
 async def _send_long_message(message: types.Message, text: str) -> None:
     if len(text) <= TELEGRAM_MAX_LEN:
-        await message.answer(text)
+        await send_queue.enqueue(message, text)
         return
-    chunks = []
-    for i in range(0, len(text), TELEGRAM_MAX_LEN):
-        chunks.append(text[i:i + TELEGRAM_MAX_LEN])
-    total = len(chunks)
-    for idx, chunk in enumerate(chunks, start=1):
-        header = f"[{idx}/{total}]\n"
-        await message.answer(header + chunk)
+    total = -(-len(text) // TELEGRAM_MAX_LEN)
+    # 分片带有 [idx/total] 序号，并发发送即使到达顺序不同也能对应
+    await asyncio.gather(*(
+        send_queue.enqueue(message, f"[{idx}/{total}]\n{chunk}")
+        for idx, chunk in enumerate(_chunks(text), start=1)
+    ))
 
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message):
@@ -91,10 +147,11 @@ async def cmd_start(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
-    await message.answer(
+    await send_queue.enqueue(
+        message,
         "欢迎使用 clawbot！\n\n"
         "我可以帮助你在 macOS 上执行命令。\n\n"
         "可用命令：\n"
@@ -122,10 +179,11 @@ async def cmd_help(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
-    await message.answer(
+    await send_queue.enqueue(
+        message,
         "clawbot 帮助信息\n\n"
         "可用命令：\n"
         "/start - 欢迎信息\n"
@@ -162,32 +220,32 @@ async def cmd_sessions(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     # 提取可选参数：数量与活跃分钟数
-    parts = message.text.split(maxsplit=2)
+    args = _SESSIONS_ARGS_RE.fullmatch(message.text)
     limit = 10
     active_minutes = 60
-    if len(parts) >= 2:
+    if args["limit"] is not None:
         try:
-            limit = int(parts[1].strip())
+            limit = int(args["limit"])
         except ValueError:
-            await message.answer("参数必须是数字，例如：/sessions 10 或 /sessions 10 60")
+            await send_queue.enqueue(message, "参数必须是数字，例如：/sessions 10 或 /sessions 10 60")
             return
-    if len(parts) == 3:
+    if args["active_minutes"] is not None:
         try:
-            active_minutes = int(parts[2].strip())
+            active_minutes = int(args["active_minutes"])
         except ValueError:
-            await message.answer("活跃分钟数必须是数字，例如：/sessions 10 60")
+            await send_queue.enqueue(message, "活跃分钟数必须是数字，例如：/sessions 10 60")
             return
 
-    result = list_sessions(limit=limit, active_minutes=active_minutes)
+    result = await asyncio.to_thread(list_sessions, limit=limit, active_minutes=active_minutes)
 
     if result["success"]:
-        await message.answer(result["message"])
+        await send_queue.enqueue(message, result["message"])
     else:
-        await message.answer(f"❌ 获取会话失败\n\n{result['message']}")
+        await send_queue.enqueue(message, f"❌ 获取会话失败\n\n{result['message']}")
 
 @dp.message(Command("session"))
 async def cmd_session(message: types.Message):
@@ -199,23 +257,20 @@ async def cmd_session(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
-    parts = message.text.split(maxsplit=2)
-    if len(parts) < 3 or parts[1] != "set":
-        await message.answer("用法：/session set <id>")
+    args = _SESSION_SET_RE.fullmatch(message.text)
+    if not args:
+        await send_queue.enqueue(message, "用法：/session set <id>")
         return
 
-    session_id = parts[2].strip()
-    if not session_id:
-        await message.answer("请提供 session id\n\n示例：/session set 1234-...")
-        return
+    session_id = args["session_id"]
 
-    bindings = _load_session_bindings()
-    bindings[str(user_id)] = session_id
-    _save_session_bindings(bindings)
-    await message.answer(f"✅ 已固定会话: {session_id}\n之后 /run 将默认使用该会话")
+    _SESSION_BINDINGS[str(user_id)] = session_id
+    async with _SESSION_BINDINGS_LOCK:
+        await asyncio.to_thread(_save_session_bindings, dict(_SESSION_BINDINGS))
+    await send_queue.enqueue(message, f"✅ 已固定会话: {session_id}\n之后 /run 将默认使用该会话")
 
 @dp.message(Command("run"))
 async def cmd_run(message: types.Message):
@@ -227,51 +282,58 @@ async def cmd_run(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     # 提取命令参数
     # 使用 split 方法更可靠地提取命令参数
-    parts = message.text.split(maxsplit=1)
-    if len(parts) < 2:
-        await message.answer("请提供要执行的命令\n\n示例：/run ls -la")
+    args = _RUN_ARGS_RE.fullmatch(message.text)
+    if not args:
+        await send_queue.enqueue(message, "请提供要执行的命令\n\n示例：/run ls -la")
         return
 
-    raw = parts[1].strip()
-    command = raw
     session_id = None
     use_continue = False
 
-    if raw.startswith("--session "):
-        rest = raw[len("--session "):].strip()
-        if " " not in rest:
-            await message.answer("请提供 session id 和命令\n\n示例：/run --session <id> 你好")
+    if args["session_id"] is not None:
+        if args["session_command"] is None:
+            await send_queue.enqueue(message, "请提供 session id 和命令\n\n示例：/run --session <id> 你好")
             return
-        session_id, command = rest.split(" ", 1)
-        command = command.strip()
-    elif raw.startswith("--continue "):
+        session_id = args["session_id"]
+        command = args["session_command"]
+    elif args["continue_command"] is not None:
         use_continue = True
-        command = raw[len("--continue "):].strip()
+        command = args["continue_command"]
+    elif args["no_cache"] is not None:
+        if args["no_cache_command"] is None:
+            await send_queue.enqueue(message, "请提供要执行的命令\n\n示例：/run --no-cache 你好")
+            return
+        command = args["no_cache_command"]
+        session_id = _SESSION_BINDINGS.get(str(user_id))
     else:
-        bindings = _load_session_bindings()
-        session_id = bindings.get(str(user_id))
+        command = args["command"]
+        session_id = _SESSION_BINDINGS.get(str(user_id))
     logger.info(f"用户 {user_id} 执行命令：{command}")
 
-    # 在执行前先记录命令参数的详细信息，用于调试
-    logger.info(f"命令参数长度: {len(command)}")
-    logger.info(f"命令参数内容: '{command}'")
+    # 命令参数详情仅在 DEBUG 级别下格式化输出
+    logger.opt(lazy=True).debug("命令参数长度: {}, 内容: {!r}", lambda: len(command), lambda: command)
 
     # 执行命令
-    result = run_command(user_id, command, session_id=session_id, use_continue=use_continue)
-
-    # 记录命令执行结果的详细信息
-    logger.info(f"命令执行结果: {result}")
+    # Claude CLI 以 asyncio 子进程执行，等待期间不占用线程；
+    # 不指定会话时由 run_command_async 交给预热进程池
+    result = await run_command_async(
+        user_id,
+        command,
+        session_id=session_id,
+        use_continue=use_continue,
+        use_cache=args["no_cache"] is None,
+    )
 
     # 格式化回复
     if result["success"]:
         await _send_long_message(message, f"✅ 执行成功\n\n{result['message']}")
     else:
-        await message.answer(f"❌ 执行失败\n\n{result['message']}")
+        await send_queue.enqueue(message, f"❌ 执行失败\n\n{result['message']}")
 
 @dp.message(Command("tui"))
 async def cmd_tui(message: types.Message):
@@ -283,25 +345,23 @@ async def cmd_tui(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        await message.answer("请提供要执行的命令\n\n示例：/tui 你好")
+        await send_queue.enqueue(message, "请提供要执行的命令\n\n示例：/tui 你好")
         return
 
     command = parts[1].strip()
-    result = run_tui_command(user_id, command)
+    result = await _run_cli(run_tui_command, user_id, command)
 
     if result["success"]:
         await _send_long_message(message, f"✅ 已发送到 TUI\n\n{result['message']}")
     else:
-        await message.answer(f"❌ 执行失败\n\n{result['message']}")
+        await send_queue.enqueue(message, f"❌ 执行失败\n\n{result['message']}")
 
-@dp.message(Command("tui-capture"))
-@dp.message(Command("tui_capture"))
-@dp.message(Command("tuicapture"))
+@dp.message(Command("tui-capture", "tui_capture", "tuicapture"))
 async def cmd_tui_capture(message: types.Message):
     """
     处理 /tui-capture 命令
@@ -311,7 +371,7 @@ async def cmd_tui_capture(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     parts = message.text.split(maxsplit=1)
@@ -320,14 +380,14 @@ async def cmd_tui_capture(message: types.Message):
         try:
             lines = int(parts[1].strip())
         except ValueError:
-            await message.answer("参数必须是数字，例如：/tui-capture 80")
+            await send_queue.enqueue(message, "参数必须是数字，例如：/tui-capture 80")
             return
 
-    result = capture_tui_output(user_id, lines=lines)
+    result = await asyncio.to_thread(capture_tui_output, user_id, lines=lines)
     if result["success"]:
         await _send_long_message(message, f"✅ TUI 输出\n\n{result['message']}")
     else:
-        await message.answer(f"❌ 获取失败\n\n{result['message']}")
+        await send_queue.enqueue(message, f"❌ 获取失败\n\n{result['message']}")
 
 @dp.message(Command("tui-start"))
 async def cmd_tui_start(message: types.Message):
@@ -339,14 +399,14 @@ async def cmd_tui_start(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
-    result = start_tui_session(user_id)
+    result = await asyncio.to_thread(start_tui_session, user_id)
     if result["success"]:
-        await message.answer(f"✅ {result['message']}")
+        await send_queue.enqueue(message, f"✅ {result['message']}")
     else:
-        await message.answer(f"❌ {result['message']}")
+        await send_queue.enqueue(message, f"❌ {result['message']}")
 
 @dp.message(Command("tui-stop"))
 async def cmd_tui_stop(message: types.Message):
@@ -358,14 +418,14 @@ async def cmd_tui_stop(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
-    result = stop_tui_session(user_id)
+    result = await asyncio.to_thread(stop_tui_session, user_id)
     if result["success"]:
-        await message.answer(f"✅ {result['message']}")
+        await send_queue.enqueue(message, f"✅ {result['message']}")
     else:
-        await message.answer(f"❌ {result['message']}")
+        await send_queue.enqueue(message, f"❌ {result['message']}")
 
 @dp.message(Command("pull"))
 async def cmd_pull(message: types.Message):
@@ -377,19 +437,19 @@ async def cmd_pull(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     # 提取文件路径
     file_path = message.text[len("/pull "):].strip()
     if not file_path:
-        await message.answer("请提供要拉取的文件路径\n\n示例：/pull ~/Documents/report.txt")
+        await send_queue.enqueue(message, "请提供要拉取的文件路径\n\n示例：/pull ~/Documents/report.txt")
         return
 
     logger.debug(f"用户 {user_id} 尝试拉取文件：{file_path}")
 
     # 验证和处理文件
-    result = pull_file(user_id, file_path)
+    result = await asyncio.to_thread(pull_file, user_id, file_path)
 
     if result["success"]:
         try:
@@ -398,9 +458,22 @@ async def cmd_pull(message: types.Message):
             )
         except Exception as e:
             logger.exception(f"文件发送失败：{result['file_path']}")
-            await message.answer(f"❌ 文件发送失败：{str(e)}")
+            await send_queue.enqueue(message, f"❌ 文件发送失败：{str(e)}")
     else:
-        await message.answer(f"❌ 拉取失败\n\n{result['message']}")
+        await send_queue.enqueue(message, f"❌ 拉取失败\n\n{result['message']}")
+
+async def _open_file_source(file_path: str):
+    """
+    获取 Telegram 文件内容
+
+    使用官方 Bot API 时返回按块读取的下载流，由 push_file 边下载边写入，
+    避免把整个文件读入内存；使用本地 Bot API 服务器时直接读取为 bytes。
+    """
+    if bot.session.api.is_local:
+        file_data = await bot.download_file(file_path)
+        return file_data.read()
+    url = bot.session.api.file_url(bot.token, file_path)
+    return bot.session.stream_content(url=url, chunk_size=256 * 1024, raise_for_status=True)
 
 @dp.message(Command("push"))
 async def cmd_push(message: types.Message):
@@ -412,14 +485,15 @@ async def cmd_push(message: types.Message):
 
     if not is_user_allowed(user_id):
         logger.warning(f"禁止用户 {user_id} 访问")
-        await message.answer("你没有访问权限，请联系管理员")
+        await send_queue.enqueue(message, "你没有访问权限，请联系管理员")
         return
 
     # 检查是否回复了文件
     if not message.reply_to_message or not (
         message.reply_to_message.document or message.reply_to_message.photo
     ):
-        await message.answer(
+        await send_queue.enqueue(
+            message,
             "请回复要推送的文件并发送 /push 命令\n\n"
             "使用方法：\n"
             "1. 发送文件\n"
@@ -434,34 +508,27 @@ async def cmd_push(message: types.Message):
         if message.reply_to_message.document:
             # 处理文档
             file = await bot.get_file(message.reply_to_message.document.file_id)
-            file_data = await bot.download_file(file.file_path)
             filename = message.reply_to_message.document.file_name
         else:
             # 处理照片（获取最高分辨率）
             photo = message.reply_to_message.photo[-1]
             file = await bot.get_file(photo.file_id)
-            file_data = await bot.download_file(file.file_path)
             filename = f"photo_{photo.file_unique_id}.jpg"
 
-        # aiogram 返回 BytesIO，需要转换为 bytes
-        if hasattr(file_data, "read"):
-            file_bytes = file_data.read()
-        else:
-            file_bytes = file_data
-
-        logger.debug(f"收到文件：{filename}，大小：{len(file_bytes)} 字节")
+        logger.debug(f"收到文件：{filename}，大小：{file.file_size} 字节")
+        file_source = await _open_file_source(file.file_path)
 
         # 保存文件
-        result = push_file(user_id, file_bytes, filename)
+        result = await push_file(user_id, file_source, filename)
 
         if result["success"]:
-            await message.answer(f"✅ 推送成功\n\n{result['message']}")
+            await send_queue.enqueue(message, f"✅ 推送成功\n\n{result['message']}")
         else:
-            await message.answer(f"❌ 推送失败\n\n{result['message']}")
+            await send_queue.enqueue(message, f"❌ 推送失败\n\n{result['message']}")
 
     except Exception as e:
         logger.exception("文件推送过程中发生错误")
-        await message.answer(f"❌ 推送失败\n\n{str(e)}")
+        await send_queue.enqueue(message, f"❌ 推送失败\n\n{str(e)}")
 
 async def main():
     """
@@ -474,11 +541,23 @@ async def main():
         logger.error("未配置 TELEGRAM_BOT_TOKEN，请在 .env 文件中设置")
         return
 
+    claude_pool.start()
     logger.info("clawbot 启动成功！")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await send_queue.stop()
+        await claude_pool.close()
+        _CLI_EXECUTOR.shutdown(wait=False, cancel_futures=True)
 
 if __name__ == "__main__":
-    import asyncio
+    # Linux/macOS 下使用 uvloop 作为事件循环（Windows 等未安装时使用默认循环）
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,84 @@
+"""Telegram 消息发送队列"""
+import asyncio
+import time
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
+
+
+class SendQueue:
+    """
+    Telegram 消息发送队列
+
+    所有回复都放入同一个队列，由固定数量的 worker 调用 Bot API 发送。
+    任一 worker 收到 TelegramRetryAfter 后，所有 worker 都会暂停到限流结束再继续，
+    避免在限流期间继续发出注定被拒绝的请求。
+    """
+
+    def __init__(self, bot: Bot, workers: int = 3):
+        self._bot = bot
+        self._workers = workers
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._paused_until = 0.0
+
+    def start(self) -> None:
+        """启动 worker（需要在事件循环中调用）"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self) -> None:
+        """停止所有 worker"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def enqueue(self, message: types.Message, text: str) -> None:
+        """
+        将回复放入队列，并等待其发送完成
+
+        与 message.answer 一样回复到原消息所在的聊天、话题（forum topic）和商业账号连接。
+
+        Args:
+            message: 要回复的消息
+            text: 消息内容
+        """
+        if not self._tasks:
+            self.start()
+        target = {
+            "chat_id": message.chat.id,
+            "message_thread_id": message.message_thread_id if message.is_topic_message else None,
+            "business_connection_id": message.business_connection_id,
+        }
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((target, text, future))
+        await future
+
+    async def _worker(self) -> None:
+        while True:
+            target, text, future = await self._queue.get()
+            try:
+                await self._send(target, text)
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, target: dict, text: str) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._bot.send_message(text=text, **target)
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"触发 Telegram 频率限制，暂停发送 {e.retry_after} 秒")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
@@ -1,5 +1,6 @@
 """clawbot 配置文件"""
 import os
+from functools import cached_property
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -8,28 +9,33 @@ class Settings(BaseSettings):
     TELEGRAM_BOT_TOKEN: str = ""
     TELEGRAM_ADMIN_IDS: str = ""
 
-    # 计算属性，用于将字符串转换为列表
-    @property
-    def admin_ids(self) -> list[int]:
+    # 计算属性，用于将字符串转换为集合（首次访问时解析并缓存，每个 update 都会检查）
+    @cached_property
+    def admin_ids(self) -> frozenset[int]:
         if not self.TELEGRAM_ADMIN_IDS:
-            return []
-        return [int(x.strip()) for x in self.TELEGRAM_ADMIN_IDS.split(",") if x.strip()]
+            return frozenset()
+        return frozenset(int(x.strip()) for x in self.TELEGRAM_ADMIN_IDS.split(",") if x.strip())
 
     # 安全配置
     ALLOWED_COMMANDS: list[str] = ["/run", "/pull", "/push"]
     BLOCKED_COMMANDS: str = "rm -rf,sudo,nc,ncat"
     WORKSPACE_DIR: str = os.path.expanduser("~/clawbot_workspace")
 
-    # 计算属性，用于将字符串转换为列表
-    @property
-    def blocked_commands(self) -> list[str]:
+    # 计算属性，用于将字符串转换为元组（首次访问时解析并缓存）
+    @cached_property
+    def blocked_commands(self) -> tuple[str, ...]:
         if not self.BLOCKED_COMMANDS:
-            return []
-        return [x.strip() for x in self.BLOCKED_COMMANDS.split(",") if x.strip()]
+            return ()
+        return tuple(x.strip() for x in self.BLOCKED_COMMANDS.split(",") if x.strip())
 
     # 执行配置
     CLAUDE_CLI_PATH: str = "claude"
     EXECUTION_TIMEOUT: int = 300  # 执行超时时间（秒）
+    CLAUDE_POOL_SIZE: int = 0  # 预热的 Claude CLI 进程数（0 表示不启用进程池）
+    CLAUDE_POOL_IDLE_TIMEOUT: float = 600.0  # 预热进程空闲超过该时间（秒）后回收
+    LLM_CACHE_ENABLED: bool = False  # 缓存不指定会话的 /run 回复，相同指令直接返回缓存
+    LLM_CACHE_TTL_DAYS: float = 7.0  # 响应缓存有效期（天）
+    LLM_SINGLEFLIGHT_ENABLED: bool = False  # 相同的 /run 指令并发执行时只运行一次，共享结果
     CLAUDE_TUI_CMD: str = "claude"  # Claude Code TUI 启动命令
     TUI_SESSION_NAME: str = "clawbot-claude"
     TUI_CAPTURE_LINES: int = 200
@@ -42,7 +48,7 @@ class Settings(BaseSettings):
 
     # 日志配置
     LOG_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs")
-    LOG_LEVEL: str = "DEBUG"
+    LOG_LEVEL: str = "INFO"
 
     # Redis 配置（用于任务队列）
     REDIS_URL: str = "redis://localhost:6379/0"
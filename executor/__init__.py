@@ -1,6 +1,8 @@
 """执行器模块"""
 from .runner import (
+    claude_pool,
     run_command,
+    run_command_async,
     pull_file,
     push_file,
     list_sessions,
@@ -11,7 +13,9 @@ from .runner import (
 )
 
 __all__ = [
+    "claude_pool",
     "run_command",
+    "run_command_async",
     "pull_file",
     "push_file",
     "list_sessions",
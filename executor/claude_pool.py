@@ -0,0 +1,166 @@
+"""Claude CLI 预热进程池 - 提前启动 claude 进程以隐藏冷启动耗时"""
+import asyncio
+import time
+from collections.abc import Mapping
+import orjson
+from loguru import logger
+from config.settings import settings
+
+
+class ClaudePool:
+    """
+    Claude CLI 预热进程池
+
+    预先以 stream-json 输入模式启动若干 claude 进程，进程完成加载后阻塞在 stdin 上等待输入。
+    收到请求时取出一个空闲进程写入 prompt 并关闭 stdin，读取输出直到进程退出。
+    每个进程只处理一个请求，不同请求之间不共享对话上下文；取出后会在后台补充新的预热进程。
+    空闲超过 idle_timeout 的进程会被回收，下一次请求时再重新预热。
+    """
+
+    def __init__(self, size: int, *, idle_timeout: float = 600.0, env: Mapping[str, str] | None = None):
+        self._size = max(0, size)
+        self._idle_timeout = idle_timeout
+        self._env = env
+        # 空闲进程列表：(进程, 启动时间)
+        self._idle: list[tuple[asyncio.subprocess.Process, float]] = []
+        self._spawning = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._reaper: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    def start(self) -> None:
+        """预热进程并启动空闲回收任务（需要在事件循环中调用）"""
+        if not self.enabled or self._reaper is not None:
+            return
+        self._reaper = asyncio.create_task(self._reap_idle())
+        self._refill()
+
+    async def close(self) -> None:
+        """停止回收任务并结束所有空闲进程"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        idle, self._idle = self._idle, []
+        for proc, _ in idle:
+            await self._kill(proc)
+
+    async def run(self, command: str, *, timeout: float) -> tuple[int, str, str]:
+        """
+        在预热进程中执行一条 prompt
+
+        Args:
+            command: 自然语言指令
+            timeout: 超时时间（秒）
+
+        Returns:
+            (返回码, 回复内容, 错误信息)
+        """
+        proc = self._checkout()
+        if proc is None:
+            logger.debug("Claude 进程池无空闲进程，冷启动新进程")
+            proc = await self._spawn()
+        self._refill()
+
+        message = {
+            "type": "user",
+            "message": {
+                "role": "user",
+                "content": [{"type": "text", "text": command}],
+            },
+        }
+        payload = orjson.dumps(message) + b"\n"
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(payload), timeout=timeout)
+        except BaseException:
+            # 超时或调用方被取消（如退出时）都要结束进程，避免 claude 在后台继续执行指令
+            await self._kill(proc)
+            raise
+
+        stderr_text = stderr.decode("utf-8", errors="ignore")
+        result = None
+        for line in stdout.splitlines():
+            try:
+                event = orjson.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and event.get("type") == "result":
+                result = event
+
+        if result is None:
+            return proc.returncode or 1, "", stderr_text or "Claude CLI 未返回结果"
+        text = result.get("result") or ""
+        if result.get("is_error"):
+            return proc.returncode or 1, "", text or stderr_text
+        return 0, text, stderr_text
+
+    def _checkout(self) -> asyncio.subprocess.Process | None:
+        while self._idle:
+            proc, _ = self._idle.pop()
+            # 健康检查：空闲期间已退出的进程直接丢弃
+            if proc.returncode is None:
+                return proc
+        return None
+
+    def _refill(self) -> None:
+        missing = self._size - len(self._idle) - self._spawning
+        for _ in range(max(0, missing)):
+            self._spawning += 1
+            task = asyncio.create_task(self._spawn_idle())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _spawn_idle(self) -> None:
+        try:
+            proc = await self._spawn()
+        except Exception:
+            logger.exception("Claude 预热进程启动失败")
+            return
+        finally:
+            self._spawning -= 1
+        self._idle.append((proc, time.monotonic()))
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            settings.CLAUDE_CLI_PATH,
+            "-p",
+            "--input-format", "stream-json",
+            "--output-format", "stream-json",
+            "--verbose",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=settings.WORKSPACE_DIR,
+            env=self._env,
+        )
+
+    async def _reap_idle(self) -> None:
+        interval = max(1.0, min(60.0, self._idle_timeout / 2))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            # 先同步地从空闲列表中摘除，再逐个结束，避免与 checkout 交错
+            expired = [
+                item for item in self._idle
+                if item[0].returncode is not None or now - item[1] > self._idle_timeout
+            ]
+            if not expired:
+                continue
+            self._idle = [item for item in self._idle if item not in expired]
+            logger.debug(f"Claude 进程池回收空闲进程: {len(expired)} 个")
+            for proc, _ in expired:
+                await self._kill(proc)
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process) -> None:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
@@ -0,0 +1,90 @@
+"""Claude CLI 响应缓存 - 以 prompt 哈希为键缓存确定性指令的回复"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from loguru import logger
+from config.settings import settings
+
+
+def prompt_key(user_id: int, command: str) -> str:
+    """
+    计算指令的缓存键
+
+    缓存按用户隔离；同一条指令在不同的 CLI 或工作目录下结果可能不同，因此一并计入哈希。
+    """
+    raw = f"{user_id}|{settings.CLAUDE_CLI_PATH}|{settings.WORKSPACE_DIR}|{command}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    # 按哈希前两位分目录，避免单个目录下文件过多
+    return os.path.join(settings.LOG_DIR, "llm_cache", key[:2], f"{key}.json")
+
+
+def get(key: str) -> dict | None:
+    """
+    读取缓存的回复
+
+    Returns:
+        {"ts", "expires", "stdout", "returncode"}，不存在、已过期或内容损坏时返回 None
+    """
+    path = _cache_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning(f"响应缓存文件损坏，已删除: {path}")
+        _remove(path)
+        return None
+
+    # 内容格式不符（手工修改、旧版本写入等）时同样视为损坏并删除
+    if (
+        not isinstance(entry, dict)
+        or not isinstance(entry.get("stdout"), str)
+        or not isinstance(entry.get("expires"), (int, float))
+        or entry["expires"] < time.time()
+    ):
+        _remove(path)
+        return None
+    return entry
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def put(key: str, response: str, ttl_days: float | None = None) -> None:
+    """
+    写入缓存的回复
+
+    Args:
+        key: prompt_key 计算出的缓存键
+        response: 回复内容
+        ttl_days: 有效期（天），默认使用 LLM_CACHE_TTL_DAYS
+    """
+    if ttl_days is None:
+        ttl_days = settings.LLM_CACHE_TTL_DAYS
+    now = time.time()
+    entry = {
+        "ts": now,
+        "expires": now + ttl_days * 86400,
+        "stdout": response,
+        "returncode": 0,
+    }
+    path = _cache_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读取到写了一半的内容
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        logger.exception(f"写入响应缓存失败: {path}")
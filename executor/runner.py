@@ -1,20 +1,84 @@
 """执行器模块 - 负责调用 Claude CLI 执行命令"""
+import asyncio
 import subprocess
 import os
-import json
 import shlex
 import re
+import stat
+import threading
 import time
 import uuid
+from collections.abc import AsyncIterable
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+import aiofiles
+import orjson
 from loguru import logger
 from config.settings import settings
+from executor import llm_cache
+from executor.claude_pool import ClaudePool
 from security import (
     is_command_allowed,
     is_path_allowed,
     log_command_execution,
 )
 
+# 注意：Telegram 代理环境会影响 Claude CLI 请求，需移除代理变量
+# 启动后唯一会修改进程环境的是 bot/main.py 设置的代理变量，而它们本就会被过滤，
+# 因此启动时计算一次即可；所有子进程共用同一份只读映射，防止被意外修改
+_PROXY_ENV_KEYS = frozenset((
+    "http_proxy", "https_proxy", "all_proxy",
+    "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY",
+))
+_CLEAN_ENV = MappingProxyType({k: v for k, v in os.environ.items() if k not in _PROXY_ENV_KEYS})
+
+# Claude CLI 预热进程池（CLAUDE_POOL_SIZE 为 0 时不启用）
+claude_pool = ClaudePool(
+    settings.CLAUDE_POOL_SIZE,
+    idle_timeout=settings.CLAUDE_POOL_IDLE_TIMEOUT,
+    env=_CLEAN_ENV,
+)
+
+# 正在执行的 /run 命令（LLM_SINGLEFLIGHT_ENABLED 开启时用于合并相同的并发请求）
+# 键为命令参数，值为 {"task": 执行任务, "waiters": 等待者数量}
+_inflight_commands: dict[tuple, dict] = {}
+
+# 会话文件解析缓存：路径 -> ((mtime_ns, size), 解析结果)
+_session_file_cache: dict[str, tuple[tuple[int, int], dict]] = {}
+# history.jsonl 增量读取状态：已读取的字节偏移、每个会话最后一行的原始内容及其解析结果
+_history_index: dict = {"offset": 0, "lines": {}, "parsed": {}}
+# list_sessions 在线程中执行，多个 /sessions 可能同时运行，以上两个缓存的读取与更新需要加锁
+_sessions_cache_lock = threading.Lock()
+# 所有 TUI 命令共用同一个 tmux 面板，发送按键、等待回复与启动/停止会话必须串行执行
+_tui_lock = threading.Lock()
+
+# DEBUG 日志中记录的输出内容最大长度
+_LOG_PREVIEW_CHARS = 512
+
+# 会话标题显示的最大长度
+_TITLE_MAX_LEN = 80
+
+# 读取 TUI 日志尾部时估算的单行字节数
+_TUI_LOG_AVG_LINE_BYTES = 256
+
+# TUI 输出清理：ANSI CSI/OSC 转义序列与除换行、制表符外的控制字符
+_ANSI_CSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+_ANSI_OSC_RE = re.compile(r"\x1b\][^\x07]*\x07")
+_CTRL_RE = re.compile(r"[\x00-\x08\x0b-\x1f]")
+
+# TUI 行前缀：回复块开始、回复块结束、输入提示符
+_TUI_REPLY_START = ("⏺", "●")
+_TUI_REPLY_END = ("❯", ">", "esc to interrupt", "✗", "✢", "─")
+_TUI_PROMPT = ("❯", ">")
+
+# 等待 TUI 输出时轮询 pipe-pane 日志的间隔，以及输出视为稳定所需的静默时间（秒）
+_TUI_POLL_INTERVAL = 0.05
+_TUI_SETTLE_SECONDS = 0.3
+
+# 用于在不解析整行 JSON 的情况下快速取出 history.jsonl 中的 sessionId
+_HISTORY_SESSION_ID_RE = re.compile(rb'"sessionId"\s*:\s*"([^"]+)"')
+
 
 def _parse_iso_ts(value: str | None):
     if not value:
@@ -27,20 +91,145 @@ def _parse_iso_ts(value: str | None):
     except Exception:
         return None
 
-def run_command(user_id: int, command: str, *, session_id: str | None = None, use_continue: bool = False) -> dict:
+@lru_cache(maxsize=512)
+def _normalize_title(value: str) -> str:
+    # str.split() 按任意空白（含换行）切分，一次即可折叠所有空白
+    text = " ".join((value or "").split())
+    if text.startswith("[Pasted text"):
+        return "(pasted text)"
+    return text[:_TITLE_MAX_LEN] + ("…" if len(text) > _TITLE_MAX_LEN else "")
+
+def _parse_history_line(sid: str, line: bytes) -> dict | None:
+    """解析 history.jsonl 中的一行，内容无效时返回 None"""
+    try:
+        item = orjson.loads(line)
+    except Exception:
+        return None
+    if not isinstance(item, dict) or item.get("sessionId") != sid:
+        return None
+    raw_title = (item.get("display") or "").strip()
+    return {
+        "title": raw_title or "(no title)",
+        "ts_ms": item.get("timestamp"),
+    }
+
+def _load_history_map(history_path: str, wanted_ids: set[str]) -> dict:
     """
-    在 Claude CLI 中执行命令
+    从 history.jsonl 中提取指定会话的标题与时间戳
 
-    Args:
-        user_id: 执行命令的用户 ID
-        command: 要执行的命令
+    只对 sessionId 属于 wanted_ids 的行做 JSON 解析；同一会话以最后一条记录为准，
+    因此从文件末尾向前扫描，所有会话都找到后即停止。
+    """
+    history_map = {}
+    with open(history_path, "rb") as f:
+        data = f.read()
+    for line in reversed(data.splitlines()):
+        match = _HISTORY_SESSION_ID_RE.search(line)
+        if not match:
+            continue
+        sid = match.group(1).decode("utf-8", errors="ignore")
+        if sid not in wanted_ids or sid in history_map:
+            continue
+        entry = _parse_history_line(sid, line)
+        if entry is None:
+            continue
+        history_map[sid] = entry
+        if len(history_map) == len(wanted_ids):
+            break
+    return history_map
 
-    Returns:
-        包含执行结果的字典
+def _load_session_file(path: str) -> dict | None:
     """
-    logger.info(f"用户 {user_id} 尝试执行命令: {command}")
+    读取会话文件，文件未变化（mtime 与大小均相同）时直接返回上次的解析结果
 
-    # 安全检查
+    文件不存在时返回 None。
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _sessions_cache_lock:
+        cached = _session_file_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "rb") as f:
+        data = orjson.loads(f.read())
+    with _sessions_cache_lock:
+        _session_file_cache[path] = (key, data)
+    return data
+
+def _load_history_incremental(history_path: str, wanted_ids: set[str]) -> dict:
+    """
+    增量读取 history.jsonl 并提取指定会话的标题与时间戳
+
+    history.jsonl 只会追加写入，因此记录上次读到的字节偏移，每次只读取新增的部分，
+    按 sessionId 保存每个会话最后一行的原始内容，需要时才做 JSON 解析。
+    文件变小（被截断或轮转）时从头重新读取；出现异常时回退为完整扫描。
+    """
+    # 偏移的读取与推进必须在同一把锁内完成，否则并发调用会重复推进偏移而跳过记录
+    with _sessions_cache_lock:
+        return _load_history_incremental_locked(history_path, wanted_ids)
+
+def _load_history_incremental_locked(history_path: str, wanted_ids: set[str]) -> dict:
+    global _history_index
+    try:
+        st = os.stat(history_path)
+    except FileNotFoundError:
+        return {}
+    index = _history_index
+    try:
+        if st.st_size < index["offset"]:
+            index = {"offset": 0, "lines": {}, "parsed": {}}
+        if st.st_size > index["offset"]:
+            with open(history_path, "rb") as f:
+                f.seek(index["offset"])
+                data = f.read()
+            # 末尾不完整的行（可能正在写入）不推进偏移，下次重新读取
+            end = data.rfind(b"\n") + 1
+            lines, parsed = index["lines"], index["parsed"]
+            for line in data[:end].splitlines():
+                match = _HISTORY_SESSION_ID_RE.search(line)
+                if match:
+                    sid = match.group(1).decode("utf-8", errors="ignore")
+                    lines[sid] = line
+                    parsed.pop(sid, None)
+            index["offset"] += end
+
+        lines, parsed = index["lines"], index["parsed"]
+        history_map = {}
+        unresolved = set()
+        for sid in wanted_ids:
+            if sid not in parsed:
+                line = lines.get(sid)
+                if line is None:
+                    continue
+                parsed[sid] = _parse_history_line(sid, line)
+            entry = parsed[sid]
+            if entry is None:
+                # 最后一行无法解析，交给完整扫描查找更早的记录
+                unresolved.add(sid)
+            else:
+                history_map[sid] = entry
+        if unresolved:
+            history_map.update(_load_history_map(history_path, unresolved))
+        _history_index = index
+        return history_map
+    except Exception:
+        logger.exception("增量读取 history.jsonl 失败，回退为完整扫描")
+        _history_index = {"offset": 0, "lines": {}, "parsed": {}}
+        return _load_history_map(history_path, wanted_ids)
+
+def _log_preview(text: str) -> str:
+    """截取日志中记录的输出内容"""
+    if len(text) <= _LOG_PREVIEW_CHARS:
+        return repr(text)
+    return repr(text[:_LOG_PREVIEW_CHARS]) + "…"
+
+def _check_command(user_id: int, command: str) -> dict | None:
+    """安全检查，命令被禁止时返回错误结果"""
     if not is_command_allowed(command):
         logger.warning(f"用户 {user_id} 尝试执行禁止的命令: {command}")
         log_command_execution(user_id, command, False, "禁止的命令")
@@ -48,90 +237,269 @@ def run_command(user_id: int, command: str, *, session_id: str | None = None, us
             "success": False,
             "message": "命令包含禁止关键词，请检查后重试"
         }
+    return None
 
-    try:
-        # 在工作目录中执行命令（避免全局 chdir 带来的并发问题）
-        logger.debug(f"在工作目录 {settings.WORKSPACE_DIR} 中执行命令")
-
-        # Claude CLI 使用 prompt 模式执行自然语言指令（-p 会直接输出并退出）
-        # 注意：Telegram 代理环境会影响 Claude CLI 请求，需移除代理变量
-        clean_env = os.environ.copy()
-        for key in (
-            "http_proxy", "https_proxy", "all_proxy",
-            "HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY",
-        ):
-            clean_env.pop(key, None)
-        cli_args = [settings.CLAUDE_CLI_PATH]
-        if use_continue:
-            cli_args.append("--continue")
-        if session_id:
-            cli_args.extend(["--session-id", session_id])
-        cli_args.extend(["-p", command])
-
-        result = subprocess.run(
-            cli_args,
-            capture_output=True,
-            text=True,
-            timeout=settings.EXECUTION_TIMEOUT,
-            cwd=settings.WORKSPACE_DIR,
-            env=clean_env,
-        )
+def _cached_result(user_id: int, command: str) -> dict | None:
+    """命中响应缓存时返回缓存的结果"""
+    cached = llm_cache.get(llm_cache.prompt_key(user_id, command))
+    if cached is None:
+        return None
+    logger.info(f"命令命中响应缓存: {command}")
+    log_command_execution(user_id, command, True, "(cached) " + cached["stdout"])
+    return {
+        "success": True,
+        "message": cached["stdout"]
+    }
 
-        # 添加详细的调试信息
-        logger.info(f"subprocess.run() 完整输出信息:")
-        logger.info(f"返回码: {result.returncode}")
-        logger.info(f"标准输出长度: {len(result.stdout)}")
-        logger.info(f"标准输出内容: '{result.stdout}'")
-        logger.info(f"标准错误长度: {len(result.stderr)}")
-        logger.info(f"标准错误内容: '{result.stderr}'")
+def _store_result(user_id: int, command: str, result: dict) -> None:
+    """将成功的结果写入响应缓存"""
+    if result["success"]:
+        llm_cache.put(llm_cache.prompt_key(user_id, command), result["message"])
+
+def _command_result(user_id: int, command: str, returncode: int, stdout: str, stderr: str) -> dict:
+    """记录审计日志，并将 Claude CLI 的执行结果转换为返回字典"""
+    # 输出详情仅在 DEBUG 级别下格式化，且只记录开头部分
+    logger.opt(lazy=True).debug(
+        "Claude CLI 输出: 返回码={}, 标准输出({} 字符): {}, 标准错误({} 字符): {}",
+        lambda: returncode,
+        lambda: len(stdout),
+        lambda: _log_preview(stdout),
+        lambda: len(stderr),
+        lambda: _log_preview(stderr),
+    )
 
-        # 记录审计日志
-        output_text = (result.stdout or result.stderr or "").strip()
-        log_command_execution(
-            user_id,
-            command,
-            result.returncode == 0,
-            output_text
-        )
+    # 记录审计日志
+    output_text = (stdout or stderr or "").strip()
+    log_command_execution(
+        user_id,
+        command,
+        returncode == 0,
+        output_text
+    )
 
-        if result.returncode == 0:
-            logger.info(f"命令执行成功: {command}")
-            message = output_text
-            # 处理命令没有输出的情况
-            if not message:
-                message = "命令已成功执行，但没有输出内容"
-            return {
-                "success": True,
-                "message": message
-            }
-        else:
-            logger.error(f"命令执行失败: {command} - {result.stderr.strip()}")
-            return {
-                "success": False,
-                "message": f"执行失败: {result.stderr.strip()}"
-            }
+    if returncode == 0:
+        logger.info(f"命令执行成功: {command}")
+        message = output_text
+        # 处理命令没有输出的情况
+        if not message:
+            message = "命令已成功执行，但没有输出内容"
+        return {
+            "success": True,
+            "message": message
+        }
+    else:
+        logger.error(f"命令执行失败: {command} - {stderr.strip()}")
+        return {
+            "success": False,
+            "message": f"执行失败: {stderr.strip()}"
+        }
 
-    except subprocess.TimeoutExpired:
+def _command_error(user_id: int, command: str, error: Exception) -> dict:
+    """记录审计日志，并将执行过程中的异常转换为返回字典"""
+    if isinstance(error, (subprocess.TimeoutExpired, asyncio.TimeoutError)):
         logger.error(f"命令执行超时: {command}")
         log_command_execution(user_id, command, False, "执行超时")
         return {
             "success": False,
             "message": "命令执行超时"
         }
-    except FileNotFoundError:
+    if isinstance(error, FileNotFoundError):
         logger.error("Claude CLI 未找到")
         log_command_execution(user_id, command, False, "Claude CLI 未找到")
         return {
             "success": False,
             "message": "Claude CLI 未找到，请确保已正确安装"
         }
+    logger.exception(f"命令执行过程中发生错误: {command}")
+    log_command_execution(user_id, command, False, str(error))
+    return {
+        "success": False,
+        "message": f"执行过程中发生错误: {str(error)}"
+    }
+
+def _cli_args(command: str, session_id: str | None, use_continue: bool) -> list[str]:
+    # Claude CLI 使用 prompt 模式执行自然语言指令（-p 会直接输出并退出）
+    cli_args = [settings.CLAUDE_CLI_PATH]
+    if use_continue:
+        cli_args.append("--continue")
+    if session_id:
+        cli_args.extend(["--session-id", session_id])
+    cli_args.extend(["-p", command])
+    return cli_args
+
+def run_command(
+    user_id: int,
+    command: str,
+    *,
+    session_id: str | None = None,
+    use_continue: bool = False,
+    use_cache: bool = True,
+) -> dict:
+    """
+    在 Claude CLI 中执行命令（同步版本，供非异步调用方使用）
+
+    Args:
+        user_id: 执行命令的用户 ID
+        command: 要执行的命令
+        use_cache: 是否使用响应缓存（需开启 LLM_CACHE_ENABLED，且不指定会话）
+
+    Returns:
+        包含执行结果的字典
+    """
+    logger.info(f"用户 {user_id} 尝试执行命令: {command}")
+
+    # 安全检查
+    rejected = _check_command(user_id, command)
+    if rejected:
+        return rejected
+
+    # 指定会话时回复依赖上下文，不使用缓存
+    cacheable = settings.LLM_CACHE_ENABLED and use_cache and not session_id and not use_continue
+    if cacheable:
+        cached = _cached_result(user_id, command)
+        if cached:
+            return cached
+
+    try:
+        # 在工作目录中执行命令（避免全局 chdir 带来的并发问题）
+        logger.debug(f"在工作目录 {settings.WORKSPACE_DIR} 中执行命令")
+        result = subprocess.run(
+            _cli_args(command, session_id, use_continue),
+            capture_output=True,
+            text=True,
+            timeout=settings.EXECUTION_TIMEOUT,
+            cwd=settings.WORKSPACE_DIR,
+            env=_CLEAN_ENV,
+        )
+        output = _command_result(user_id, command, result.returncode, result.stdout, result.stderr)
+        if cacheable:
+            _store_result(user_id, command, output)
+        return output
     except Exception as e:
-        logger.exception(f"命令执行过程中发生错误: {command}")
-        log_command_execution(user_id, command, False, str(e))
-        return {
-            "success": False,
-            "message": f"执行过程中发生错误: {str(e)}"
-        }
+        return _command_error(user_id, command, e)
+
+
+async def _exec_cli(cli_args: list[str], *, timeout: float) -> tuple[int, str, str]:
+    """以 asyncio 子进程执行 Claude CLI，超时或被取消时结束子进程"""
+    proc = await asyncio.create_subprocess_exec(
+        *cli_args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=settings.WORKSPACE_DIR,
+        env=_CLEAN_ENV,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except BaseException:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+        raise
+    return (
+        proc.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
+
+
+async def run_command_async(
+    user_id: int,
+    command: str,
+    *,
+    session_id: str | None = None,
+    use_continue: bool = False,
+    use_cache: bool = True,
+) -> dict:
+    """
+    在 Claude CLI 中执行命令（异步版本）
+
+    子进程由事件循环直接管理，等待期间不占用线程。
+    不指定会话且启用了预热进程池时，交给进程池执行以省去 Claude CLI 冷启动。
+
+    Args:
+        user_id: 执行命令的用户 ID
+        command: 要执行的命令
+        use_cache: 是否使用响应缓存（需开启 LLM_CACHE_ENABLED，且不指定会话）
+
+    Returns:
+        包含执行结果的字典
+    """
+    logger.info(f"用户 {user_id} 尝试执行命令: {command}")
+
+    rejected = _check_command(user_id, command)
+    if rejected:
+        return rejected
+
+    if not settings.LLM_SINGLEFLIGHT_ENABLED:
+        return await _execute_command(user_id, command, session_id, use_continue, use_cache)
+
+    # 相同的指令正在执行时直接等待其结果，不再重复启动 Claude CLI
+    # 响应缓存按用户隔离，开启缓存时合并也限定在同一用户内，避免拿到其他用户的缓存回复
+    owner = user_id if settings.LLM_CACHE_ENABLED else None
+    key = (owner, command, session_id, use_continue, use_cache)
+    entry = _inflight_commands.get(key)
+    joined = entry is not None
+    if entry is None:
+        task = asyncio.create_task(
+            _execute_command(user_id, command, session_id, use_continue, use_cache)
+        )
+        entry = {"task": task, "waiters": 0}
+        _inflight_commands[key] = entry
+        task.add_done_callback(
+            lambda t: _inflight_commands.pop(key, None) if _inflight_commands.get(key) is entry else None
+        )
+    else:
+        logger.info(f"用户 {user_id} 的命令与正在执行的相同命令合并: {command}")
+
+    entry["waiters"] += 1
+    try:
+        # shield：单个等待者被取消时，其他等待者仍能拿到结果
+        result = await asyncio.shield(entry["task"])
+    finally:
+        entry["waiters"] -= 1
+        if entry["waiters"] == 0 and not entry["task"].done():
+            # 所有等待者都已取消，取消执行以结束 Claude CLI 子进程；
+            # 同时移除记录，避免新请求在任务结束前合并进来而收到 CancelledError
+            if _inflight_commands.get(key) is entry:
+                del _inflight_commands[key]
+            entry["task"].cancel()
+
+    if joined:
+        log_command_execution(user_id, command, result["success"], "(shared) " + result["message"])
+    return result
+
+
+async def _execute_command(
+    user_id: int,
+    command: str,
+    session_id: str | None,
+    use_continue: bool,
+    use_cache: bool,
+) -> dict:
+    """查询响应缓存，未命中时通过进程池或 asyncio 子进程执行 Claude CLI"""
+    cacheable = settings.LLM_CACHE_ENABLED and use_cache and not session_id and not use_continue
+    if cacheable:
+        cached = await asyncio.to_thread(_cached_result, user_id, command)
+        if cached:
+            return cached
+
+    try:
+        if claude_pool.enabled and not session_id and not use_continue:
+            returncode, stdout, stderr = await claude_pool.run(command, timeout=settings.EXECUTION_TIMEOUT)
+        else:
+            returncode, stdout, stderr = await _exec_cli(
+                _cli_args(command, session_id, use_continue),
+                timeout=settings.EXECUTION_TIMEOUT,
+            )
+        output = _command_result(user_id, command, returncode, stdout, stderr)
+        if cacheable:
+            await asyncio.to_thread(_store_result, user_id, command, output)
+        return output
+    except Exception as e:
+        return _command_error(user_id, command, e)
 
 
 def list_sessions(limit: int = 10, active_minutes: int = 60) -> dict:
@@ -153,35 +521,16 @@ def list_sessions(limit: int = 10, active_minutes: int = 60) -> dict:
         }
 
     try:
-        history_path = os.path.expanduser("~/.claude/history.jsonl")
-        history_map = {}
-        if os.path.isfile(history_path):
-            try:
-                with open(history_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            item = json.loads(line)
-                        except Exception:
-                            continue
-                        sid = item.get("sessionId")
-                        if not sid:
-                            continue
-                        raw_title = (item.get("display") or "").strip()
-                        history_map[sid] = {
-                            "title": raw_title or "(no title)",
-                            "ts_ms": item.get("timestamp"),
-                        }
-            except Exception:
-                history_map = {}
-
-        active_ids = set()
-        if os.path.isdir(session_env_dir):
-            for name in os.listdir(session_env_dir):
-                if name and os.path.isdir(os.path.join(session_env_dir, name)):
-                    active_ids.add(name)
+        # 会话 ID -> session-env 目录的 mtime，scandir 一次拿到类型与 stat 信息
+        # 目录不存在时直接由 scandir 报错，省去一次额外的 isdir 检查
+        active_ids = {}
+        try:
+            with os.scandir(session_env_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        active_ids[entry.name] = entry.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            pass
 
         if not active_ids:
             return {
@@ -189,67 +538,68 @@ def list_sessions(limit: int = 10, active_minutes: int = 60) -> dict:
                 "message": "暂无正在运行的会话"
             }
 
-        def normalize_title(value: str) -> str:
-            text = (value or "").replace("\n", " ").replace("\r", " ").strip()
-            text = " ".join(text.split())
-            if text.startswith("[Pasted text"):
-                return "(pasted text)"
-            max_len = 80
-            return text[:max_len] + ("…" if len(text) > max_len else "")
+        def make_item(sid: str, title: str, updated_at, created_at, mtime: float) -> dict:
+            # 排序、过滤和输出都使用同一个时间，构造时只计算一次
+            ts = updated_at or created_at or datetime.fromtimestamp(mtime)
+            return {
+                "id": sid,
+                "title": title,
+                "ts": ts,
+                "ts_epoch": ts.timestamp(),
+            }
 
         sessions = []
-        for sid in active_ids:
-            env_dir = os.path.join(session_env_dir, sid)
+        # 没有会话文件的会话，稍后从 history.jsonl 中补充标题
+        without_file = {}
+        seen_paths = set()
+        for sid, mtime in active_ids.items():
             session_path = os.path.join(sessions_dir, f"{sid}.json")
-            mtime = os.path.getmtime(env_dir)
-            if os.path.isfile(session_path):
-                try:
-                    with open(session_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    updated_at = _parse_iso_ts(data.get("updatedAt"))
-                    created_at = _parse_iso_ts(data.get("createdAt"))
-                    sessions.append({
-                        "id": data.get("id") or sid,
-                        "title": data.get("title") or "(no title)",
-                        "updated_at": updated_at,
-                        "created_at": created_at,
-                        "mtime": mtime,
-                    })
-                except Exception:
-                    sessions.append({
-                        "id": sid,
-                        "title": "(unreadable)",
-                        "updated_at": None,
-                        "created_at": None,
-                        "mtime": mtime,
-                    })
-            else:
-                hist = history_map.get(sid)
-                hist_ts = None
-                if hist and isinstance(hist.get("ts_ms"), (int, float)):
-                    hist_ts = datetime.fromtimestamp(hist["ts_ms"] / 1000)
-                sessions.append({
-                    "id": sid,
-                    "title": normalize_title((hist.get("title") if hist else None) or "(no session file)"),
-                    "updated_at": hist_ts or datetime.fromtimestamp(mtime),
-                    "created_at": None,
-                    "mtime": mtime,
-                })
-
-        def sort_key(item):
-            return (
-                item["updated_at"] or item["created_at"] or datetime.fromtimestamp(item["mtime"])
-            )
+            seen_paths.add(session_path)
+            try:
+                data = _load_session_file(session_path)
+                if data is None:
+                    without_file[sid] = mtime
+                    continue
+                sessions.append(make_item(
+                    data.get("id") or sid,
+                    data.get("title") or "(no title)",
+                    _parse_iso_ts(data.get("updatedAt")),
+                    _parse_iso_ts(data.get("createdAt")),
+                    mtime,
+                ))
+            except Exception:
+                sessions.append(make_item(sid, "(unreadable)", None, None, mtime))
 
-        sessions.sort(key=sort_key, reverse=True)
+        # 清理已不再活跃的会话文件缓存
+        with _sessions_cache_lock:
+            for path in list(_session_file_cache):
+                if path not in seen_paths:
+                    _session_file_cache.pop(path, None)
+
+        history_map = {}
+        if without_file:
+            history_path = os.path.expanduser("~/.claude/history.jsonl")
+            try:
+                history_map = _load_history_incremental(history_path, set(without_file))
+            except Exception:
+                history_map = {}
+
+        for sid, mtime in without_file.items():
+            hist = history_map.get(sid)
+            hist_ts = None
+            if hist and isinstance(hist.get("ts_ms"), (int, float)):
+                hist_ts = datetime.fromtimestamp(hist["ts_ms"] / 1000)
+            sessions.append(make_item(
+                sid,
+                _normalize_title((hist.get("title") if hist else None) or "(no session file)"),
+                hist_ts,
+                None,
+                mtime,
+            ))
 
         # 仅保留真正活跃的会话（最近 active_minutes 内有更新）
-        now = datetime.now()
-        cutoff = now.timestamp() - max(1, active_minutes) * 60
-        def is_active(item):
-            ts = item["updated_at"] or item["created_at"] or datetime.fromtimestamp(item["mtime"])
-            return ts.timestamp() >= cutoff
-        sessions = [s for s in sessions if is_active(s)]
+        cutoff = time.time() - max(1, active_minutes) * 60
+        sessions = [s for s in sessions if s["ts_epoch"] >= cutoff]
 
         if not sessions:
             return {
@@ -257,13 +607,13 @@ def list_sessions(limit: int = 10, active_minutes: int = 60) -> dict:
                 "message": f"暂无最近 {active_minutes} 分钟内活跃的会话"
             }
 
+        sessions.sort(key=lambda item: item["ts_epoch"], reverse=True)
+
         limit = max(1, min(limit, 20))
-        lines = []
-        for s in sessions[:limit]:
-            ts = s["updated_at"] or s["created_at"] or datetime.fromtimestamp(s["mtime"])
-            ts_str = ts.strftime("%Y-%m-%dT%H")
-            title = normalize_title(s["title"])
-            lines.append(f"{s['id']} | {title} | updated: {ts_str}")
+        lines = [
+            f"{s['id']} | {_normalize_title(s['title'])} | updated: {s['ts'].strftime('%Y-%m-%dT%H')}"
+            for s in sessions[:limit]
+        ]
 
         return {
             "success": True,
@@ -294,13 +644,30 @@ def _tmux_run(args: list[str], *, timeout: float = 5.0) -> subprocess.CompletedP
         )
 
 
+def _tmux_run_batch(commands: list[list[str]], *, timeout: float = 5.0) -> subprocess.CompletedProcess:
+    """
+    用 tmux 的 ";" 命令链在一次调用中顺序执行多条命令，任一命令失败后不再执行后续命令
+
+    tmux 会把以 ";" 结尾的参数当作命令分隔符，这类参数末尾的 ";" 会转义为 "\\;"。
+    """
+    args: list[str] = []
+    for cmd in commands:
+        if args:
+            args.append(";")
+        args.extend(arg[:-1] + "\\;" if arg.endswith(";") else arg for arg in cmd)
+    return _tmux_run(args, timeout=timeout)
+
+
 def _ensure_tui_session() -> dict:
     session_name = settings.TUI_SESSION_NAME
     log_path = os.path.join(settings.LOG_DIR, settings.TUI_LOG_FILE)
     os.makedirs(settings.LOG_DIR, exist_ok=True)
-    has = _tmux_run(["has-session", "-t", session_name])
+    # 会话存在时在同一次调用中开启 pipe-pane；has-session 失败时 pipe-pane 不会执行
+    has = _tmux_run_batch([
+        ["has-session", "-t", session_name],
+        ["pipe-pane", "-o", "-t", session_name, f"cat >> {log_path}"],
+    ])
     if has.returncode == 0:
-        _tmux_run(["pipe-pane", "-o", "-t", session_name, f"cat >> {log_path}"])
         return {"success": True, "message": "TUI 会话已存在"}
 
     cmd = ["new-session", "-d", "-s", session_name, "-c", settings.WORKSPACE_DIR]
@@ -315,14 +682,75 @@ def _ensure_tui_session() -> dict:
     return {"success": True, "message": "TUI 会话已启动"}
 
 
+def _wait_tui_output(log_path: str, timeout: float) -> bool:
+    """
+    等待 TUI 输出出现并趋于稳定
+
+    通过 pipe-pane 日志文件的大小判断输出变化：文件增长后连续 _TUI_SETTLE_SECONDS 秒
+    没有新输出即返回，最长等待 timeout 秒；日志文件不可用时退化为固定等待。
+
+    Returns:
+        是否等满了 timeout（输出提前稳定时返回 False）
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        last_size = os.stat(log_path).st_size
+    except OSError:
+        time.sleep(max(0.0, timeout))
+        return True
+    last_change = None
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            return True
+        if last_change is not None and now - last_change >= _TUI_SETTLE_SECONDS:
+            return False
+        time.sleep(min(_TUI_POLL_INTERVAL, deadline - now))
+        try:
+            size = os.stat(log_path).st_size
+        except OSError:
+            continue
+        if size != last_size:
+            last_size = size
+            last_change = time.monotonic()
+
+
+def _read_log_tail(path: str, lines: int) -> str:
+    """
+    读取日志文件的最后 lines 行
+
+    TUI 日志只会追加增长，这里按估算的行长从文件末尾读取一个窗口，
+    行数不够时再扩大窗口，避免每次都读取整个文件。
+    """
+    lines = max(1, int(lines))
+    with open(path, "rb") as f:
+        pos = os.fstat(f.fileno()).st_size
+        chunk = lines * _TUI_LOG_AVG_LINE_BYTES
+        data = b""
+        while pos > 0:
+            # 向前扩大窗口时只读取尚未读过的部分
+            start = max(0, pos - chunk)
+            f.seek(start)
+            data = f.read(pos - start) + data
+            pos = start
+            # 窗口起点可能落在一行中间，需要多出一个换行才能保证最后 lines 行完整
+            if data.count(b"\n") > lines:
+                break
+            chunk *= 2
+    tail_lines = data.splitlines()
+    if pos > 0:
+        tail_lines = tail_lines[1:]
+    return b"\n".join(tail_lines[-lines:]).decode("utf-8", errors="ignore")
+
+
 def _capture_tui_raw(lines: int | None = None) -> dict:
     session_name = settings.TUI_SESSION_NAME
     capture_lines = lines or settings.TUI_CAPTURE_LINES
-    logger.info(f"TUI capture 请求: session={session_name}, lines={capture_lines}")
+    logger.debug(f"TUI capture 请求: session={session_name}, lines={capture_lines}")
+    # 不加 -e：输出中的颜色等转义序列最终都会被去掉，不如让 tmux 直接输出纯文本
     result = _tmux_run([
         "capture-pane",
         "-p",
-        "-e",
         "-J",
         "-a",
         "-t",
@@ -334,7 +762,6 @@ def _capture_tui_raw(lines: int | None = None) -> dict:
         result = _tmux_run([
             "capture-pane",
             "-p",
-            "-e",
             "-J",
             "-t",
             session_name,
@@ -346,8 +773,11 @@ def _capture_tui_raw(lines: int | None = None) -> dict:
             "success": False,
             "message": "获取 TUI 输出超时，请重试"
         }
-    logger.info(
-        f"TUI capture 结果: code={result.returncode}, stdout_len={len(result.stdout)}, stderr='{result.stderr.strip()}'"
+    logger.opt(lazy=True).debug(
+        "TUI capture 结果: code={}, stdout_len={}, stderr={}",
+        lambda: result.returncode,
+        lambda: len(result.stdout),
+        lambda: _log_preview(result.stderr.strip()),
     )
     if result.returncode != 0:
         return {
@@ -357,10 +787,10 @@ def _capture_tui_raw(lines: int | None = None) -> dict:
     output = result.stdout
     if output:
         # Strip ANSI escape sequences and non-printable chars (keep newlines/tabs)
-        output = re.sub(r"\x1b\[[0-9;?]*[A-Za-z]", "", output)
-        output = re.sub(r"\x1b\][^\x07]*\x07", "", output)
-        output = "".join(ch for ch in output if ch == "\n" or ch == "\t" or ch >= " ")
-        output = output.strip()
+        # 未用 -e 抓取时通常没有转义序列，只需处理个别控制字符
+        if "\x1b" in output:
+            output = _ANSI_OSC_RE.sub("", _ANSI_CSI_RE.sub("", output))
+        output = _CTRL_RE.sub("", output).strip()
     if output:
         return {
             "success": True,
@@ -370,9 +800,7 @@ def _capture_tui_raw(lines: int | None = None) -> dict:
     log_path = os.path.join(settings.LOG_DIR, settings.TUI_LOG_FILE)
     if os.path.isfile(log_path):
         try:
-            with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-                data = f.readlines()
-            tail = "".join(data[-max(1, int(capture_lines)):]).strip()
+            tail = _read_log_tail(log_path, capture_lines).strip()
             if tail:
                 return {
                     "success": True,
@@ -415,77 +843,77 @@ def _limit_tui_output(text: str) -> str:
 
 
 def _extract_tui_reply(text: str) -> str:
-    lines = [ln.rstrip() for ln in text.splitlines()]
     reply_lines: list[str] = []
     latest_reply: list[str] = []
-    for ln in lines:
-        if ln.strip().startswith(("⏺", "●")):
+    for ln in text.splitlines():
+        st = ln.strip()
+        if st.startswith(_TUI_REPLY_START):
             # Start a new reply block
-            reply_lines = [ln.strip()]
+            reply_lines = [st]
             continue
         if reply_lines:
-            if ln.strip().startswith(("❯", ">", "esc to interrupt", "✗", "✢", "─")):
+            if st.startswith(_TUI_REPLY_END):
                 latest_reply = reply_lines
                 reply_lines = []
                 continue
-            if ln.strip():
-                reply_lines.append(ln.strip())
+            if st:
+                reply_lines.append(st)
     if reply_lines:
         latest_reply = reply_lines
     return "\n".join(latest_reply).strip()
 
 
-def _extract_reply_after_prompt(text: str, command: str) -> str:
-    lines = [ln.rstrip() for ln in text.splitlines()]
-    idxs = _find_prompt_indices(lines, command)
-    if not idxs:
-        return ""
-    return _extract_reply_after_index(lines, idxs[-1])
-
-
-def _find_prompt_indices(lines: list[str], command: str) -> list[int]:
-    needle = command.strip()
-    if len(needle) > 24:
-        needle = needle[:24]
-    indices: list[int] = []
-    for i, ln in enumerate(lines):
-        if ln.lstrip().startswith(("❯", ">")) and (not needle or needle in ln):
-            indices.append(i)
-    return indices
-
+def _scan_tui_prompt_reply(text: str, command: str) -> tuple[int, bool, bool, str]:
+    """
+    单次扫描 TUI 输出，定位带标记的输入提示符及其后的回复
 
-def _extract_reply_after_index(lines: list[str], start_idx: int) -> str:
+    Returns:
+        (匹配的提示符数量, 最后一个提示符之后是否已出现下一个提示符,
+         两个提示符之间是否有回复块, 回复内容)
+    """
+    needle = command.strip()[:24]
+    prompt_count = 0
+    next_prompt = False
+    has_reply = False
+    reply_done = False
     reply_lines: list[str] = []
-    for ln in lines[start_idx + 1:]:
-        if ln.strip().startswith(("⏺", "●")):
-            reply_lines = [ln.strip()]
+    for ln in text.splitlines():
+        st = ln.strip()
+        is_prompt = st.startswith(_TUI_PROMPT)
+        if is_prompt and (not needle or needle in st):
+            # 新的匹配提示符，重新开始记录其后的内容
+            prompt_count += 1
+            next_prompt = has_reply = reply_done = False
+            reply_lines = []
             continue
-        if reply_lines:
-            if ln.strip().startswith(("❯", ">", "esc to interrupt", "✗", "✢", "─")):
-                break
-            if ln.strip():
-                reply_lines.append(ln.strip())
-    return "\n".join(reply_lines).strip()
-
-
-def _find_next_prompt_index(lines: list[str], start_idx: int) -> int | None:
-    for i in range(start_idx + 1, len(lines)):
-        if lines[i].lstrip().startswith(("❯", ">")):
-            return i
-    return None
-
-
-def _segment_has_reply(lines: list[str]) -> bool:
-    for ln in lines:
-        if ln.strip().startswith(("⏺", "●")):
-            return True
-    return False
+        if not prompt_count or next_prompt:
+            continue
+        if is_prompt:
+            next_prompt = True
+            continue
+        if st.startswith(_TUI_REPLY_START):
+            has_reply = True
+            if not reply_done:
+                reply_lines = [st]
+            continue
+        if reply_lines and not reply_done:
+            if st.startswith(_TUI_REPLY_END):
+                reply_done = True
+            elif st:
+                reply_lines.append(st)
+    return prompt_count, next_prompt, has_reply, "\n".join(reply_lines).strip()
 
 
 def run_tui_command(user_id: int, command: str, *, capture_lines: int | None = None) -> dict:
     """
     在 Claude Code TUI 中执行命令（tmux 会话）
+
+    同一时间只有一个命令操作 tmux 面板，后到的命令等待前一个完成。
     """
+    with _tui_lock:
+        return _run_tui_command_locked(user_id, command, capture_lines)
+
+def _run_tui_command_locked(user_id: int, command: str, capture_lines: int | None) -> dict:
     logger.info(f"用户 {user_id} 尝试执行 TUI 命令: {command}")
 
     if not is_command_allowed(command):
@@ -508,16 +936,16 @@ def run_tui_command(user_id: int, command: str, *, capture_lines: int | None = N
         before_reply = _extract_tui_reply(before_text)
         req_id = uuid.uuid4().hex[:8]
         tagged_command = f"[[clawbot:{req_id}]] {command}"
-        before_prompts = _find_prompt_indices(
-            [ln.rstrip() for ln in before_text.splitlines()], tagged_command
-        )
-        before_prompt_count = len(before_prompts)
+        before_prompt_count = _scan_tui_prompt_reply(before_text, tagged_command)[0]
 
         # Ensure not stuck in copy-mode and send a real Enter key
-        _tmux_run(["send-keys", "-t", session_name, "-X", "cancel"])
-        _tmux_run(["send-keys", "-t", session_name, "C-u"])
-        _tmux_run(["send-keys", "-t", session_name, "-l", tagged_command])
-        send = _tmux_run(["send-keys", "-t", session_name, "Enter"])
+        # copy-mode -q 不在任何模式中时也不会报错，不会中断后面的命令链
+        send = _tmux_run_batch([
+            ["copy-mode", "-q", "-t", session_name],
+            ["send-keys", "-t", session_name, "C-u"],
+            ["send-keys", "-t", session_name, "-l", tagged_command],
+            ["send-keys", "-t", session_name, "Enter"],
+        ])
         if send.returncode != 0:
             msg = send.stderr.strip() or "发送指令失败"
             log_command_execution(user_id, f"tui:{command}", False, msg)
@@ -529,35 +957,33 @@ def run_tui_command(user_id: int, command: str, *, capture_lines: int | None = N
         found_reply = False
         max_attempts = int(settings.TUI_WAIT_ATTEMPTS)
         max_wait = max(1.0, float(settings.TUI_MAX_WAIT_SECONDS))
+        log_path = os.path.join(settings.LOG_DIR, settings.TUI_LOG_FILE)
         start_ts = time.monotonic()
+        # attempts 只统计等满 TUI_CAPTURE_DELAY 的轮次，输出提前稳定的抓取不计入 TUI_WAIT_ATTEMPTS
         attempts = 0
+        ticks = 0
         while (time.monotonic() - start_ts) < max_wait and (max_attempts <= 0 or attempts < max_attempts):
-            attempts += 1
-            time.sleep(settings.TUI_CAPTURE_DELAY)
+            ticks += 1
+            remaining = max_wait - (time.monotonic() - start_ts)
+            if _wait_tui_output(log_path, min(settings.TUI_CAPTURE_DELAY, remaining)):
+                attempts += 1
             current = _capture_tui_raw(lines=capture_lines)
             if not current.get("success"):
                 continue
             last_raw = current.get("message", "") or ""
-            current_lines = [ln.rstrip() for ln in last_raw.splitlines()]
-            current_prompts = _find_prompt_indices(current_lines, tagged_command)
+            prompt_count, next_prompt, has_reply, reply = _scan_tui_prompt_reply(last_raw, tagged_command)
             current_reply = ""
-            if len(current_prompts) > before_prompt_count:
-                start_idx = current_prompts[-1]
-                next_prompt_idx = _find_next_prompt_index(current_lines, start_idx)
-                if next_prompt_idx is None:
-                    done = False
-                    segment = current_lines[start_idx:]
-                else:
-                    segment = current_lines[start_idx:next_prompt_idx]
-                    done = _segment_has_reply(segment)
+            if prompt_count > before_prompt_count:
+                done = next_prompt and has_reply
                 logger.info(
-                    f"TUI wait tick #{attempts}: prompts={len(current_prompts)} done={done} next_prompt={next_prompt_idx is not None}"
+                    f"TUI wait tick #{ticks}: prompts={prompt_count} done={done} next_prompt={next_prompt}"
                 )
                 if done:
                     # Extract reply between tagged prompt and next prompt
-                    current_reply = _extract_reply_after_index(segment, 0)
+                    current_reply = reply
             if current_reply and current_reply != before_reply:
-                logger.info("TUI reply detected:\n" + current_reply)
+                logger.info(f"TUI reply detected: {len(current_reply)} 字符")
+                logger.opt(lazy=True).debug("TUI reply: {}", lambda: _log_preview(current_reply))
                 output = {
                     "success": True,
                     "message": current_reply.strip() or "(no output)"
@@ -567,7 +993,7 @@ def run_tui_command(user_id: int, command: str, *, capture_lines: int | None = N
         if not found_reply:
             elapsed = time.monotonic() - start_ts
             logger.info(
-                f"TUI wait انته止: attempts={attempts}, elapsed={elapsed:.1f}s, max_wait={max_wait}s"
+                f"TUI wait انته止: attempts={attempts}, ticks={ticks}, elapsed={elapsed:.1f}s, max_wait={max_wait}s"
             )
             output = current
 
@@ -611,6 +1037,10 @@ def run_tui_command(user_id: int, command: str, *, capture_lines: int | None = N
 
 
 def start_tui_session(user_id: int) -> dict:
+    with _tui_lock:
+        return _start_tui_session_locked(user_id)
+
+def _start_tui_session_locked(user_id: int) -> dict:
     try:
         ensure = _ensure_tui_session()
         log_command_execution(user_id, "tui:start", ensure["success"], ensure["message"])
@@ -656,6 +1086,11 @@ def capture_tui_output(user_id: int, *, lines: int | None = None) -> dict:
 
 
 def stop_tui_session(user_id: int) -> dict:
+    # 等待正在执行的 TUI 命令结束后再停止，避免在其等待回复时关闭会话
+    with _tui_lock:
+        return _stop_tui_session_locked(user_id)
+
+def _stop_tui_session_locked(user_id: int) -> dict:
     try:
         session_name = settings.TUI_SESSION_NAME
         killed = _tmux_run(["kill-session", "-t", session_name])
@@ -733,13 +1168,77 @@ def pull_file(user_id: int, file_path: str) -> dict:
         "file_path": normalized_path
     }
 
-def push_file(user_id: int, file_data: bytes, filename: str) -> dict:
+# 流式写入 push 文件时每批累积的数据量与块数上限（块数需小于系统 IOV_MAX）
+_PUSH_BATCH_BYTES = 1024 * 1024
+_PUSH_BATCH_CHUNKS = 64
+
+def _writev_all(fd: int, chunks: list[bytes]) -> None:
+    """将多个数据块写入文件，支持 writev 时一次系统调用写入整批"""
+    if not hasattr(os, "writev"):
+        data = memoryview(b"".join(chunks))
+        while data:
+            data = data[os.write(fd, data):]
+        return
+    views = [memoryview(c) for c in chunks if c]
+    idx = 0
+    while idx < len(views):
+        written = os.writev(fd, views[idx:])
+        # writev 可能只写入一部分，跳过已写完的块后继续
+        while idx < len(views) and written >= len(views[idx]):
+            written -= len(views[idx])
+            idx += 1
+        if written:
+            views[idx] = views[idx][written:]
+
+async def _write_stream(target_path: str, chunks: AsyncIterable[bytes]) -> int:
+    """
+    将异步数据流按批写入文件，返回写入的总字节数
+
+    先写入同目录下的临时文件，全部写完后再替换目标文件；
+    下载中断时只删除临时文件，已有的同名文件保持不变。
+    """
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.part"
+    fd = await asyncio.to_thread(os.open, tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    total = 0
+    try:
+        try:
+            batch: list[bytes] = []
+            batch_size = 0
+            async for chunk in chunks:
+                batch.append(chunk)
+                batch_size += len(chunk)
+                if batch_size >= _PUSH_BATCH_BYTES or len(batch) >= _PUSH_BATCH_CHUNKS:
+                    await asyncio.to_thread(_writev_all, fd, batch)
+                    total += batch_size
+                    batch, batch_size = [], 0
+            if batch:
+                await asyncio.to_thread(_writev_all, fd, batch)
+                total += batch_size
+        finally:
+            await asyncio.to_thread(os.close, fd)
+        await asyncio.to_thread(os.replace, tmp_path, target_path)
+    except BaseException:
+        # 尽快关闭下载流以释放底层连接
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return total
+
+async def push_file(user_id: int, file_data: bytes | AsyncIterable[bytes], filename: str) -> dict:
     """
     推送文件（从 Telegram 到 macOS）
 
     Args:
         user_id: 用户 ID
-        file_data: 文件二进制数据
+        file_data: 文件二进制数据，或按块产生数据的异步流（边接收边写入）
         filename: 文件名
 
     Returns:
@@ -760,11 +1259,15 @@ def push_file(user_id: int, file_data: bytes, filename: str) -> dict:
         }
 
     try:
-        # 写入文件
-        with open(target_path, "wb") as f:
-            f.write(file_data)
+        # 写入文件（异步写入，避免大文件阻塞事件循环）
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            async with aiofiles.open(target_path, "wb") as f:
+                await f.write(file_data)
+            file_size = len(file_data)
+        else:
+            file_size = await _write_stream(target_path, file_data)
 
-        log_command_execution(user_id, f"push {filename}", True, f"文件大小: {len(file_data)} 字节")
+        log_command_execution(user_id, f"push {filename}", True, f"文件大小: {file_size} 字节")
         return {
             "success": True,
             "message": f"文件已保存到: {target_path}"
@@ -1,12 +1,29 @@
 """访问控制和审计模块"""
 import os
+import re
+import json
+import queue
+import atexit
+import fnmatch
 import logging
+import threading
 from datetime import datetime
+from functools import lru_cache
+import orjson
 from config.settings import settings
 from loguru import logger
 
 logger = logging.getLogger(__name__)
 
+def _dump_audit_line(entry: dict) -> bytes:
+    """将审计日志条目序列化为一行 UTF-8 编码的 JSON"""
+    try:
+        return orjson.dumps(entry) + b"\n"
+    except TypeError:
+        # orjson 不接受含孤立代理字符等无效内容的字符串，交给标准库处理
+        pass
+    return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8", errors="replace")
+
 def is_user_allowed(user_id: int) -> bool:
     """
     检查用户是否被允许使用 Bot
@@ -24,6 +41,23 @@ def is_user_allowed(user_id: int) -> bool:
 
     return user_id in settings.admin_ids
 
+# 禁止关键词超过该数量时改用正则交替匹配，一次扫描完成全部检查
+_BLOCKLIST_REGEX_THRESHOLD = 16
+
+@lru_cache(maxsize=1)
+def _compile_blocklist(blocked: tuple[str, ...]) -> tuple[tuple[str, ...], re.Pattern | None]:
+    """
+    预处理禁止关键词列表：统一转为小写，关键词较多时额外编译为单个正则
+
+    按配置的元组缓存，配置变化时自动重新生成。
+    """
+    lowered = tuple(dict.fromkeys(b.lower() for b in blocked))
+    if len(lowered) <= _BLOCKLIST_REGEX_THRESHOLD:
+        return lowered, None
+    # 长关键词优先，避免较短的关键词抢先匹配
+    alternation = "|".join(re.escape(b) for b in sorted(lowered, key=len, reverse=True))
+    return lowered, re.compile(alternation)
+
 def is_command_allowed(command: str) -> bool:
     """
     检查命令是否被允许执行
@@ -34,14 +68,38 @@ def is_command_allowed(command: str) -> bool:
     Returns:
         是否被允许
     """
+    blocked_terms, blocked_re = _compile_blocklist(settings.blocked_commands)
+    if not blocked_terms:
+        return True
+    command_lower = command.lower()
+
     # 检查是否在禁止命令列表中
-    for blocked in settings.blocked_commands:
-        if blocked in command.lower():
+    if blocked_re is not None:
+        match = blocked_re.search(command_lower)
+        if match:
+            logger.warning(f"命令包含禁止关键词: {match.group(0)}")
+            return False
+        return True
+
+    for blocked in blocked_terms:
+        if blocked in command_lower:
             logger.warning(f"命令包含禁止关键词: {blocked}")
             return False
 
     return True
 
+@lru_cache(maxsize=1)
+def _compile_prohibited_paths(paths: tuple[str, ...]) -> tuple[tuple[str, ...], re.Pattern | None]:
+    """
+    预处理禁止访问的路径列表
+
+    普通路径拆出为前缀元组，直接交给 str.startswith 匹配；
+    通配符路径（如 /Users/*/Library）按 fnmatch 规则编译为单个正则整体匹配。
+    """
+    prefixes = tuple(p for p in paths if "*" not in p)
+    wildcards = [fnmatch.translate(p) for p in paths if "*" in p]
+    return prefixes, re.compile("|".join(wildcards)) if wildcards else None
+
 def is_path_allowed(file_path: str) -> bool:
     """
     检查文件路径是否被允许访问
@@ -64,16 +122,12 @@ def is_path_allowed(file_path: str) -> bool:
         return True
 
     # 检查是否在禁止访问的路径中
-    for prohibited in settings.PROHIBITED_PATHS:
-        # 处理通配符路径（如 /Users/*/Library）
-        if "*" in prohibited:
-            import fnmatch
-            if fnmatch.fnmatch(normalized_path, prohibited):
-                logger.warning(f"路径禁止访问: {normalized_path}")
-                return False
-        elif normalized_path.startswith(prohibited):
-            logger.warning(f"路径禁止访问: {normalized_path}")
-            return False
+    prefixes, wildcard_re = _compile_prohibited_paths(tuple(settings.PROHIBITED_PATHS))
+    if normalized_path.startswith(prefixes) or (
+        wildcard_re is not None and wildcard_re.match(normalized_path)
+    ):
+        logger.warning(f"路径禁止访问: {normalized_path}")
+        return False
 
     return True
 
@@ -95,10 +149,95 @@ def log_command_execution(user_id: int, command: str, success: bool, result: str
         "result": result
     }
 
-    # 写入 JSONL 格式的日志文件
-    log_file = os.path.join(settings.LOG_DIR, f"audit_{datetime.now().strftime('%Y%m%d')}.jsonl")
-    import json
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+    # 写入 JSONL 格式的日志文件（由后台线程批量写入）
+    _audit_queue.put_nowait((datetime.now().strftime('%Y%m%d'), log_entry))
 
     logger.info(f"命令执行记录: 用户 {user_id} 执行 '{command}' {'成功' if success else '失败'}")
+
+# 审计日志写入队列，元素为 (日期, 日志条目)，None 表示停止
+_audit_queue: queue.Queue = queue.Queue()
+# 每批最多写入的条目数
+_AUDIT_BATCH_SIZE = 64
+
+# 按日期缓存已打开的审计日志文件，只在后台写入线程中访问
+_audit_files: dict = {}
+
+def _audit_file(day: str):
+    """获取当天审计日志的文件句柄，跨天时关闭之前日期的文件"""
+    f = _audit_files.get(day)
+    if f is None:
+        f = open(os.path.join(settings.LOG_DIR, f"audit_{day}.jsonl"), "ab")
+        for old_day in [d for d in _audit_files if d < day]:
+            _audit_files.pop(old_day).close()
+        _audit_files[day] = f
+    return f
+
+def _close_audit_files() -> None:
+    for f in _audit_files.values():
+        try:
+            f.close()
+        except Exception:
+            pass
+    _audit_files.clear()
+
+def _write_audit_batch(batch: list[tuple[str, dict]]) -> None:
+    """按日期分组，将一批审计日志追加写入对应的文件"""
+    grouped: dict[str, list[bytes]] = {}
+    for day, entry in batch:
+        grouped.setdefault(day, []).append(_dump_audit_line(entry))
+    for day, lines in grouped.items():
+        try:
+            f = _audit_file(day)
+            f.writelines(lines)
+            # 每批写完即刷新，文件句柄保持打开，省去每次写入的 open/close
+            f.flush()
+        except Exception:
+            logger.exception(f"写入审计日志失败: audit_{day}.jsonl")
+            # 丢弃出错的句柄，下次写入时重新打开
+            f = _audit_files.pop(day, None)
+            if f is not None:
+                try:
+                    f.close()
+                except Exception:
+                    pass
+
+def _audit_worker() -> None:
+    """后台写入审计日志：取出一条后尽量凑满一批再写入"""
+    # 收到结束标记后保持 stopping，直到队列清空再退出，避免标记在凑批时丢失
+    stopping = False
+    while True:
+        if stopping:
+            try:
+                item = _audit_queue.get_nowait()
+            except queue.Empty:
+                item = None
+        else:
+            item = _audit_queue.get()
+        batch = []
+        if item is None:
+            stopping = True
+        else:
+            batch.append(item)
+        while len(batch) < _AUDIT_BATCH_SIZE:
+            try:
+                item = _audit_queue.get(timeout=0 if stopping else 0.1)
+            except queue.Empty:
+                break
+            if item is None:
+                stopping = True
+                continue
+            batch.append(item)
+        if batch:
+            _write_audit_batch(batch)
+        if stopping and _audit_queue.empty():
+            _close_audit_files()
+            return
+
+_audit_thread = threading.Thread(target=_audit_worker, name="audit-writer", daemon=True)
+_audit_thread.start()
+
+@atexit.register
+def _flush_audit_log() -> None:
+    """进程退出前写完队列中剩余的审计日志"""
+    _audit_queue.put(None)
+    _audit_thread.join(timeout=5)